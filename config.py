@@ -6,14 +6,23 @@ class Settings(BaseSettings):
     # API Settings
     API_URL: str = "http://ds.opmentis.xyz"
     TASK_POLL_INTERVAL: int = 100  # seconds
+    TASK_LONG_POLL_WAIT: int = 0  # seconds the server may hold get_next_task; 0 disables long polling
+    UPLOAD_COMPRESSION: bool = False  # gzip result uploads (server must accept Content-Encoding: gzip)
+    KEEP_LOCAL_ARTIFACTS: bool = False  # also write result files under the temp dir for inspection
     
     # Model Settings
     MODEL_PARAMS_DIR: str = "./alphafold/data/"
+    ALPHAFOLD_PARAMS_SHA256: Optional[str] = None  # expected digest of the params archive; always logged
     USE_GPU: bool = False
+    MAX_CONCURRENT_PREDICTIONS: int = 1  # models run through inference at once; raise only with memory for several
     
     # GPU Settings
     TF_FORCE_UNIFIED_MEMORY: int = 1
     XLA_PYTHON_CLIENT_MEM_FRACTION: float = 4.0
+    USE_BF16_MATMUL: bool = False  # faster on tensor cores, but predictions may drift from fp32 miners
+    
+    # JAX persistent compilation cache, reused across validator restarts
+    JAX_COMPILATION_CACHE_DIR: Optional[str] = "~/.cache/desci-validator/jax"
     
     # Validator Settings
     WALLET_ADDRESS: Optional[str] = None
@@ -23,6 +32,19 @@ class Settings(BaseSettings):
         if self.USE_GPU:
             os.environ['TF_FORCE_UNIFIED_MEMORY'] = str(self.TF_FORCE_UNIFIED_MEMORY)
             os.environ['XLA_PYTHON_CLIENT_MEM_FRACTION'] = str(self.XLA_PYTHON_CLIENT_MEM_FRACTION)
+            if self.USE_BF16_MATMUL:
+                import jax
+
+                jax.config.update('jax_default_matmul_precision', 'bfloat16')
+    
+    def setup_jax_cache(self):
+        """Enable JAX's persistent compilation cache if configured"""
+        if self.JAX_COMPILATION_CACHE_DIR:
+            import jax
+
+            cache_dir = os.path.expanduser(self.JAX_COMPILATION_CACHE_DIR)
+            os.makedirs(cache_dir, exist_ok=True)
+            jax.config.update('jax_compilation_cache_dir', cache_dir)
     
     class Config:
         env_file = ".env"
@@ -1,137 +1,361 @@
 import aiohttp
+import asyncio
 import logging
 import pickle
-import gzip
-import base64
+import zlib
+import io
+import numpy as np
 from typing import Dict, Optional
 from tabulate import tabulate
-import os
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential
+
+try:
+    # SIMD accelerated codec; falls back to the stdlib when not installed
+    from pybase64 import b64decode
+except ImportError:
+    from base64 import b64decode
+
+try:
+    # Optional libdeflate bindings (not in requirements.txt): single-shot gzip
+    # decompression, ~2-3x faster than zlib but the payload is buffered first
+    import deflate
+except ImportError:
+    deflate = None
 
 logger = logging.getLogger(__name__)
 
+# Read size used when streaming the MSA payload off the socket
+MSA_CHUNK_SIZE = 128 * 1024
+
+# Connect and socket-read timeouts (seconds). There is no total cap because MSA
+# downloads and result uploads can be large; a stalled read still fails
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 60
+
+# Gateway/overload statuses that usually clear up on a retry
+_RETRYABLE_STATUSES = frozenset({502, 503, 504})
+
+class RetryableHTTPError(Exception):
+    """Transient server-side HTTP failure"""
+
+def _raise_for_retryable(response: aiohttp.ClientResponse):
+    if response.status in _RETRYABLE_STATUSES:
+        raise RetryableHTTPError(f"{response.method} {response.url} returned {response.status}")
+
+# Exponential backoff for transient connection errors and gateway failures
+_retryable = retry(
+    stop=stop_after_attempt(5),
+    wait=wait_exponential(multiplier=0.5, min=0.5, max=8),
+    retry=retry_if_exception_type((aiohttp.ClientConnectionError, asyncio.TimeoutError, RetryableHTTPError)),
+    reraise=True
+)
+
+# Leading bytes of a zip archive, i.e. an ``np.savez`` payload
+_NPZ_MAGIC = b'PK\x03\x04'
+
+# Bytes outside the base64 alphabet; skipped while decoding, like b64decode does
+_B64_IGNORED = bytes(
+    b for b in range(256)
+    if b not in b'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/='
+)
+
+# X-MSA-Raw-Size is untrusted: output is never preallocated beyond this
+# multiple of the compressed bytes received so far
+_PREALLOC_RATIO = 32
+
+# Last (items, rendered table) pair, reused while the payload is unchanged
+_last_table = (None, None)
+
 def log_dict_as_table(data_dict, logger=logger):
-    headers = ['Attribute', 'Value']
-    table_data = [[k, v] for k, v in data_dict.items()]
-    table = tabulate(
-        table_data,
-        headers=headers,
-        tablefmt='grid',  
-        numalign='left',
-        stralign='left'
-    )
+    global _last_table
+    if not logger.isEnabledFor(logging.INFO):
+        return
+
+    items = list(data_dict.items())
+    if items == _last_table[0]:
+        table = _last_table[1]
+    else:
+        table = tabulate(
+            [[k, v] for k, v in items],
+            headers=['Attribute', 'Value'],
+            tablefmt='grid',  
+            numalign='left',
+            stralign='left'
+        )
+        _last_table = (items, table)
     
     separator = '-' * 80
-    logger.info(f"\n{separator}\n{table}\n{separator}")
+    logger.info("\n%s\n%s\n%s", separator, table, separator)
+
+def load_msa_features(raw: bytes) -> Dict:
+    """Deserialize decompressed MSA features
+
+    ``.npz`` archives are loaded with ``allow_pickle=False`` so no code from the
+    payload is executed. Anything else is treated as a legacy pickle payload.
+    """
+    if raw[:4] == _NPZ_MAGIC:
+        with np.load(io.BytesIO(raw), allow_pickle=False) as npz:
+            return {name: npz[name] for name in npz.files}
+    return pickle.loads(raw)
+
+class MsaPayloadDecoder:
+    """Incrementally decode a base64 encoded, gzipped MSA features payload
+
+    Chunks are base64 decoded as they arrive. When libdeflate is available the
+    whole gzip stream is buffered and decompressed in one shot on finish,
+    otherwise it is inflated chunk by chunk with zlib.
+    """
+
+    def __init__(self, raw_size: Optional[int] = None):
+        """
+        Args:
+            raw_size: Decompressed payload size, if the server sent it. Used to
+                grow the zlib output buffer in few steps; never trusted beyond
+                ``_PREALLOC_RATIO`` times the compressed input seen so far.
+        """
+        self._pending = b''
+        self._inflater = None if deflate else zlib.decompressobj(wbits=zlib.MAX_WBITS | 16)
+        self._compressed = bytearray()
+        self._raw_size = raw_size or 0
+        self._received = 0
+        self._buffer = bytearray()
+        self._size = 0
+
+    def _write(self, data: bytes):
+        end = self._size + len(data)
+        if end > len(self._buffer):
+            capacity = min(self._raw_size, _PREALLOC_RATIO * self._received)
+            if capacity > end:
+                self._buffer += bytes(capacity - len(self._buffer))
+            else:
+                del self._buffer[self._size:]
+                self._buffer += data
+                self._size = end
+                return
+        self._buffer[self._size:end] = data
+        self._size = end
+
+    def feed(self, chunk: bytes):
+        """Decode and decompress the next chunk of the payload"""
+        chunk = self._pending + chunk.translate(None, _B64_IGNORED)
+        aligned = len(chunk) - len(chunk) % 4
+        self._pending = chunk[aligned:]
+        if aligned:
+            decoded = b64decode(memoryview(chunk)[:aligned], validate=False)
+            if self._inflater is None:
+                self._compressed += decoded
+            else:
+                self._received += len(decoded)
+                self._write(self._inflater.decompress(decoded))
+
+    def finish(self) -> Dict:
+        """Flush the decoder and deserialize the MSA features"""
+        if self._pending:
+            raise ValueError("MSA payload is not valid base64: truncated input")
+        if self._inflater is None:
+            # libdeflate sizes its output from the gzip ISIZE trailer itself
+            return load_msa_features(deflate.gzip_decompress(self._compressed))
+        self._write(self._inflater.flush())
+        if not self._inflater.eof:
+            raise EOFError("MSA payload ended before the end-of-stream marker")
+        del self._buffer[self._size:]
+        return load_msa_features(self._buffer)
 
 class ClientService:
-    def __init__(self, api_url: str):
+    def __init__(self, api_url: str, compress_uploads: bool = False):
         """Initialize client service
         
         Args:
             api_url: Base URL for server API
+            compress_uploads: Gzip result uploads on the fly (Content-Encoding: gzip)
         """
         self.api_url = api_url.rstrip('/')
+        self.compress_uploads = compress_uploads
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def __aenter__(self) -> "ClientService":
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """Shared HTTP session; requires ``open()`` or ``async with`` first"""
+        if self._session is None or self._session.closed:
+            raise RuntimeError("ClientService session is not open; use 'async with ClientService(...)'")
+        return self._session
+
+    async def open(self):
+        """Open the shared HTTP session used by all requests"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=32,
+                limit_per_host=16,
+                keepalive_timeout=75,
+                ttl_dns_cache=300,
+                enable_cleanup_closed=True
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers={'Connection': 'keep-alive'},
+                timeout=aiohttp.ClientTimeout(
+                    total=None,
+                    connect=CONNECT_TIMEOUT,
+                    sock_read=READ_TIMEOUT
+                )
+            )
+
+    async def close(self):
+        """Close the shared HTTP session and its pooled connections"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    @_retryable
+    async def get_next_task(self, wallet_address: str, wait: int = 0) -> Optional[Dict]:
+        """Get next validation task from server
         
-    async def get_next_task(self, wallet_address: str) -> Optional[Dict]:
-        """Get next validation task from server"""
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                f"{self.api_url}/validators/next",
-                params={"wallet_address": wallet_address}
-            ) as response:
-                if response.status == 429:
-                    logger.warning(f"Cooldown Activity: {await response.text()}")
-                    return None
-                    
-                if response.status == 200:
-                    return await response.json()
+        Args:
+            wallet_address: Validator wallet address
+            wait: Seconds the server may hold the request open until a task
+                is assigned (long polling); 0 returns immediately
+        """
+        params = {"wallet_address": wallet_address}
+        if wait:
+            params["wait"] = wait
+        async with self.session.get(
+            f"{self.api_url}/validators/next",
+            params=params,
+            # The server may legitimately stay silent for up to ``wait`` seconds
+            timeout=aiohttp.ClientTimeout(
+                total=None,
+                connect=CONNECT_TIMEOUT,
+                sock_read=wait + READ_TIMEOUT
+            )
+        ) as response:
+            _raise_for_retryable(response)
+            if response.status == 429:
+                logger.warning(f"Cooldown Activity: {await response.text()}")
                 return None
                 
+            if response.status == 200:
+                return await response.json()
+            return None
+                
+    @_retryable
     async def get_msa_results(self, task_id: str, wallet: str, pointer_wallet: str) -> Dict:
         """Get MSA results for task"""
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                f"{self.api_url}/validators/msa/{task_id}",
-                params={
-                    "pointer_wallet": pointer_wallet,
-                    "wallet": wallet
-                    }
-            ) as response:
-                if response.status != 200:
-                    raise Exception(f"Failed to get MSA results: {await response.text()}")
-                
-                logger.info("Decoding MSA features...")
-                data = await response.read()
-                decoded_data = base64.b64decode(data)
-
-                logger.info("Decompressing MSA features...")
+        async with self.session.get(
+            f"{self.api_url}/validators/msa/{task_id}",
+            params={
+                "pointer_wallet": pointer_wallet,
+                "wallet": wallet
+                }
+        ) as response:
+            _raise_for_retryable(response)
+            if response.status != 200:
+                raise Exception(f"Failed to get MSA results: {await response.text()}")
+            
+            logger.info("Decoding MSA features...")
+            raw_size = response.headers.get('X-MSA-Raw-Size')
+            decoder = MsaPayloadDecoder(
+                raw_size=int(raw_size) if raw_size and raw_size.isdigit() else None
+            )
+            await self._decode_stream(response.content, decoder)
 
-                decompressed_data = gzip.decompress(decoded_data)
+            logger.info("Loading MSA results...")
+            # Deserialize the npz (or legacy pickle) data back into NumPy arrays,
+            # off the event loop so status updates and uploads keep flowing
+            return await asyncio.to_thread(decoder.finish)
+                        
+    async def _decode_stream(self, content: aiohttp.StreamReader, decoder: MsaPayloadDecoder):
+        """Feed ``content`` to ``decoder`` on a worker thread
 
-                logger.info("Loading MSA results...")
-                # Deserialize the pickled data back into a NumPy array
-                data = pickle.loads(decompressed_data)
+        Each chunk is decoded while the next one is downloaded, so end-to-end
+        time tends towards max(network, cpu) instead of their sum.
+        """
+        pending = None
+        try:
+            async for chunk in content.iter_chunked(MSA_CHUNK_SIZE):
+                if pending is not None:
+                    await pending
+                pending = asyncio.create_task(asyncio.to_thread(decoder.feed, chunk))
+            if pending is not None:
+                await pending
+        finally:
+            if pending is not None and not pending.done():
+                pending.cancel()
 
-                return data
-                # return await response.json()
-                        
-    async def upload_validation_results(self, task_id: str, wallet: str, file_path: str, file_type: str) -> bool:
+    @_retryable
+    async def upload_validation_results(
+        self,
+        task_id: str,
+        wallet: str,
+        filename: str,
+        data: bytes,
+        file_type: str
+    ) -> bool:
+        """Upload one in-memory result file for a task"""
         try:      
-            with open(file_path, 'rb') as f:
-                file_data = f.read()
-                
             form_data = aiohttp.FormData()
             form_data.add_field('file',
-                            file_data,
-                            filename=os.path.basename(file_path))
+                            data,
+                            filename=filename,
+                            content_type='application/octet-stream')
+            
+            async with self.session.post(
+                f"{self.api_url}/validators/results/{task_id}",
+                params={
+                    "task_id": task_id,
+                    "file_type": file_type,
+                    "wallet": wallet
+                },
+                data=form_data,
+                compress='gzip' if self.compress_uploads else None
+            ) as response:         
+                _raise_for_retryable(response)
+                if response.status != 200:
+                    error_detail = await response.json()
+                    logger.error(f"Upload failed: {error_detail}")
+                    return False
+                return True
             
-            async with aiohttp.ClientSession() as session:    
-                async with session.post(
-                    f"{self.api_url}/validators/results/{task_id}",
-                    params={
-                        "task_id": task_id,
-                        "file_type": file_type,
-                        "wallet": wallet
-                    },
-                    data=form_data
-                ) as response:         
-                    if response.status != 200:
-                        error_detail = await response.json()
-                        logger.error(f"Upload failed: {error_detail}")
-                        return False
-                    return True
-                
         except Exception as e:
             logger.error(f"Error uploading result: {e}")
             raise
 
+    @_retryable
     async def update_task_status(self, task_id: str, wallet: str, status: str) -> bool:
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{self.api_url}/validators/status/{task_id}",
-                    params={
-                        "wallet": wallet,
-                        "status": status
-                    }
-                ) as response:
-                    if response.status != 200:
-                        error_detail = await response.json()
-                        logger.error(f"Update failed: {error_detail}")
-                        return False
-                    return True
+            async with self.session.post(
+                f"{self.api_url}/validators/status/{task_id}",
+                params={
+                    "wallet": wallet,
+                    "status": status
+                }
+            ) as response:
+                _raise_for_retryable(response)
+                if response.status != 200:
+                    error_detail = await response.json()
+                    logger.error(f"Update failed: {error_detail}")
+                    return False
+                return True
         except Exception as e:
             logger.error(f"Error updating task status: {e}")
             raise
             
+    @_retryable
     async def get_validator_info(self, wallet_address: str):
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(f"{self.api_url}/incentives/customer/{wallet_address}") as response:
-                    if response.status != 200:
-                        return
-                    response_data = await response.json()
-                    log_dict_as_table(data_dict=response_data)
+            async with self.session.get(f"{self.api_url}/incentives/customer/{wallet_address}") as response:
+                _raise_for_retryable(response)
+                if response.status != 200:
+                    return
+                response_data = await response.json()
+                log_dict_as_table(data_dict=response_data)
                 
         except Exception as e:
-            raise logger.error(f"Error getting validator info: {e}")
+            logger.error(f"Error getting validator info: {e}")
+            raise
@@ -0,0 +1,104 @@
+"""Tests for the streaming MSA payload decoder."""
+
+import base64
+import gzip
+import io
+import pickle
+from unittest import mock
+
+from absl.testing import absltest
+from absl.testing import parameterized
+import numpy as np
+
+from services import client_service
+
+
+def _features():
+    return {
+        'msa': np.arange(40000, dtype=np.int32).reshape(200, 200),
+        'seq_length': np.full(200, 200, dtype=np.int32),
+        'sequence': np.array([b'A' * 200], dtype=object),
+    }
+
+
+def _encode(raw: bytes, wrap: int = 0) -> bytes:
+    """base64(gzip(raw)), optionally wrapped into lines like MIME encoders do"""
+    encoded = base64.b64encode(gzip.compress(raw))
+    if wrap:
+        encoded = b'\n'.join(
+            encoded[i:i + wrap] for i in range(0, len(encoded), wrap)
+        )
+    return encoded
+
+
+def _decode(payload: bytes, chunk_size: int, raw_size=None):
+    decoder = client_service.MsaPayloadDecoder(raw_size=raw_size)
+    for i in range(0, len(payload), chunk_size):
+        decoder.feed(payload[i:i + chunk_size])
+    return decoder.finish()
+
+
+class MsaPayloadDecoderTest(parameterized.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        # Exercise the incremental zlib path even when libdeflate is installed
+        self.enter_context(mock.patch.object(client_service, 'deflate', None))
+        self.features = _features()
+        self.raw = pickle.dumps(self.features)
+
+    def assertFeaturesEqual(self, decoded):
+        self.assertCountEqual(decoded.keys(), self.features.keys())
+        for name, value in self.features.items():
+            np.testing.assert_array_equal(decoded[name], value)
+
+    @parameterized.parameters(1, 7, 128 * 1024)
+    def test_chunk_sizes(self, chunk_size):
+        self.assertFeaturesEqual(_decode(_encode(self.raw), chunk_size))
+
+    @parameterized.parameters(1, 7, 128 * 1024)
+    def test_wrapped_and_quoted_base64(self, chunk_size):
+        # JSON string bodies arrive quoted, MIME style encoders wrap lines
+        payload = b'"' + _encode(self.raw, wrap=76) + b'"\n'
+        self.assertFeaturesEqual(_decode(payload, chunk_size))
+
+    def test_npz_payload(self):
+        buffer = io.BytesIO()
+        np.savez(buffer, msa=self.features['msa'])
+        decoded = _decode(_encode(buffer.getvalue()), 4096)
+        np.testing.assert_array_equal(decoded['msa'], self.features['msa'])
+
+    @parameterized.named_parameters(
+        ('exact', 1.0),
+        ('too_small', 0.25),
+        ('too_large', 4.0),
+        ('absurd', 1e9),
+    )
+    def test_raw_size_header(self, factor):
+        raw_size = int(len(self.raw) * factor)
+        payload = _encode(self.raw)
+        decoder = client_service.MsaPayloadDecoder(raw_size=raw_size)
+        for i in range(0, len(payload), 1000):
+            decoder.feed(payload[i:i + 1000])
+            # An untrusted header never reserves more than the input justifies
+            self.assertLessEqual(
+                len(decoder._buffer),
+                max(decoder._size, client_service._PREALLOC_RATIO * decoder._received)
+            )
+        self.assertFeaturesEqual(decoder.finish())
+
+    def test_truncated_base64(self):
+        payload = _encode(self.raw)
+        with self.assertRaisesRegex(ValueError, 'truncated'):
+            _decode(payload[:-1], 1000)
+
+    def test_truncated_gzip_stream(self):
+        payload = _encode(self.raw)
+        # Cut on a base64 quantum boundary so only the gzip stream is short
+        cut = (len(payload) // 2) // 4 * 4
+        with self.assertRaises(EOFError):
+            _decode(payload[:cut], 1000)
+
+
+if __name__ == '__main__':
+    absltest.main()
@@ -3,8 +3,25 @@ import numpy as np
 import logging
 from typing import Dict, Optional
 
+try:
+    # C serializer; encodes the PAE matrix without building nested Python lists
+    import orjson
+except ImportError:
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
+def pae_json(pae: np.ndarray, max_pae: float) -> str:
+    """Same output as ``confidence.pae_json``, serialized with orjson if available"""
+    if orjson is None:
+        return confidence.pae_json(pae=pae, max_pae=max_pae)
+    if pae.ndim != 2 or pae.shape[0] != pae.shape[1]:
+        raise ValueError(f'PAE must be a square matrix, got {pae.shape}')
+    return orjson.dumps([{
+        'predicted_aligned_error': np.round(pae.astype(np.float64), decimals=1),
+        'max_predicted_aligned_error': max_pae,
+    }], option=orjson.OPT_SERIALIZE_NUMPY).decode()
+
 class ConfidenceService:
     def calculate_metrics(
         self,
@@ -18,7 +35,7 @@ class ConfidenceService:
         }
         
         if pae is not None and max_pae is not None:
-            metrics['pae_json'] = confidence.pae_json(
+            metrics['pae_json'] = pae_json(
                 pae=pae,
                 max_pae=float(max_pae)
             )
@@ -1,20 +1,163 @@
 from alphafold.model import model, config, data
+from alphafold.model.tf import shape_placeholders
 from alphafold.common import protein
+from alphafold.relax import relax
 import numpy as np
+import jax
+import asyncio
+import os
+import functools
 import logging
-from typing import Dict
+from typing import Dict, Tuple
 
 logger = logging.getLogger(__name__)
 
+# Sequences are zero-padded up to one of these lengths so the jitted model is
+# only compiled for a handful of shapes; longer sequences run unpadded. Above
+# 512 the steps are 256 residues, since pair memory grows with the square of
+# the padded length
+SEQ_LEN_BUCKETS = (256, 512) + tuple(range(768, 2048 + 1, 256))
+
+def bucket_length(seq_len: int) -> int:
+    """Return the padded length used for a sequence of ``seq_len`` residues"""
+    for bucket in SEQ_LEN_BUCKETS:
+        if seq_len <= bucket:
+            return bucket
+    return seq_len
+
+# Upper bound for the memory-derived Evoformer sub-batch size
+MAX_SUBBATCH_SIZE = 32
+
+def subbatch_size_for(num_res: int, default: int = 4) -> int:
+    """Pick the Evoformer inference sub-batch size for the local accelerator
+    
+    Larger sub-batches mean fewer, bigger kernel launches. The size is derived
+    from the device memory limit (not current free memory) so it is stable and
+    compiled runners can be reused; it is rounded down to a power of two and
+    capped at ``MAX_SUBBATCH_SIZE`` and ``num_res``. Devices without memory
+    stats (CPU) keep ``default``.
+    """
+    try:
+        stats = jax.devices()[0].memory_stats() or {}
+    except Exception:
+        return default
+    bytes_limit = stats.get('bytes_limit')
+    if not bytes_limit:
+        return default
+    # bytes_limit is XLA_PYTHON_CLIENT_MEM_FRACTION x physical memory, and the
+    # fraction exceeds 1 with unified memory; scale back to the physical device
+    try:
+        mem_fraction = float(os.environ.get('XLA_PYTHON_CLIENT_MEM_FRACTION', 0.75))
+    except ValueError:
+        return default
+    if mem_fraction <= 0:
+        return default
+    device_bytes = bytes_limit / mem_fraction
+    # MSA row attention logits per residue row: num_res^2 x 8 heads x fp32,
+    # double-buffered; budget an eighth of the device, the rest is for the pair
+    # representation, weights and other activations
+    per_row = num_res * num_res * 8 * 4 * 2
+    size = int(device_bytes // 8) // per_row
+    if size <= default:
+        return default
+    size = 1 << (size.bit_length() - 1)
+    return max(default, min(size, MAX_SUBBATCH_SIZE, num_res))
+
+def pad_features(features: Dict, feature_shapes: Dict, num_res: int) -> Dict:
+    """Zero-pad every residue axis of processed features to ``num_res``
+    
+    Args:
+        features: Output of ``RunModel.process_features``
+        feature_shapes: Shape schema, i.e. ``config.data.eval.feat``
+        num_res: Target number of residues
+    """
+    padded = {}
+    for name, value in features.items():
+        shape = feature_shapes.get(name)
+        pad_width = [(0, 0)] * value.ndim
+        if shape is not None:
+            # Processed features carry a leading ensemble dimension
+            for axis, dim in enumerate(shape, start=value.ndim - len(shape)):
+                if dim == shape_placeholders.NUM_RES:
+                    pad_width[axis] = (0, num_res - value.shape[axis])
+        padded[name] = np.pad(value, pad_width) if any(after for _, after in pad_width) else value
+    return padded
+
+def unpad_prediction(prediction: Dict, seq_len: int) -> Dict:
+    """Return the outputs used downstream, sliced back to ``seq_len``
+
+    Scores pooled over all residues would include the padding, so ``ptm`` is
+    dropped and ``ranking_confidence`` is recomputed from the sliced pLDDT.
+    """
+    plddt = prediction['plddt'][:seq_len]
+    structure = prediction['structure_module']
+    unpadded = {
+        'plddt': plddt,
+        # Monomer models rank by mean pLDDT
+        'ranking_confidence': np.mean(plddt),
+        'structure_module': {
+            key: structure[key][:seq_len]
+            for key in ('final_atom_positions', 'final_atom_mask')
+        },
+    }
+    if 'predicted_aligned_error' in prediction:
+        unpadded['predicted_aligned_error'] = (
+            prediction['predicted_aligned_error'][:seq_len, :seq_len]
+        )
+        unpadded['max_predicted_aligned_error'] = prediction['max_predicted_aligned_error']
+    return unpadded
+
+@functools.lru_cache(maxsize=8)
+def load_model_params(model_name: str, params_dir: str):
+    """Load haiku params for a model once per process"""
+    return data.get_model_haiku_params(model_name, params_dir)
+
 class ModelService:
-    def __init__(self, model_params_dir: str):
+    def __init__(self, model_params_dir: str, max_concurrent_predictions: int = 1):
         """Initialize model service
         
         Args:
             model_params_dir: Directory containing AlphaFold params
+            max_concurrent_predictions: Models allowed to run inference at once;
+                one more model may process its features meanwhile, the rest
+                wait without holding features in memory
         """
+        if max_concurrent_predictions < 1:
+            raise ValueError("max_concurrent_predictions must be at least 1")
         self.model_params_dir = model_params_dir
         self.model_names = config.MODEL_PRESETS['monomer'] + ('model_2_ptm',)
+        self._relaxer = relax.AmberRelaxation(
+            max_iterations=0,
+            tolerance=2.39,
+            stiffness=10.0,
+            exclude_residues=[],
+            max_outer_iterations=3,
+            use_gpu=False  # Set via config if needed
+        )
+        # Runners keyed by (model_name, max_recycles, subbatch_size), built on first use
+        self._runners: Dict[Tuple[str, int, int], model.RunModel] = {}
+        self._runners_lock = asyncio.Lock()
+        self._predict_slots = asyncio.Semaphore(max_concurrent_predictions)
+        # Bounds how many models hold processed features at any one time
+        self._feature_slots = asyncio.Semaphore(max_concurrent_predictions + 1)
+
+    def _get_runner(
+        self,
+        model_name: str,
+        max_recycles: int,
+        subbatch_size: int
+    ) -> model.RunModel:
+        """Return a cached model runner, loading config and params on first use"""
+        key = (model_name, max_recycles, subbatch_size)
+        if key not in self._runners:
+            cfg = config.model_config(model_name)
+            cfg.model.num_recycle = max_recycles
+            cfg.model.global_config.subbatch_size = subbatch_size
+            
+            params = load_model_params(model_name, self.model_params_dir)
+            
+            self._runners[key] = model.RunModel(cfg, params)
+        return self._runners[key]
         
     async def predict_structure(
         self, 
@@ -36,53 +179,78 @@ class ModelService:
             - plddt: Per-residue confidence scores
             - pae: Predicted aligned error if available
         """
-        results = {}
+        # Run prediction for each model concurrently
+        predictions = await asyncio.gather(*[
+            self._predict_model(model_name, msa_features, max_recycles)
+            for model_name in self.model_names
+        ])
+        results = dict(zip(self.model_names, predictions))
+                
+        # Select best model and optionally relax
+        best_model = self._select_best_model(results)
         
-        # Run prediction for each model
-        for model_name in self.model_names:
-            cfg = config.model_config(model_name)
-            cfg.model.num_recycle = max_recycles
-            
-            params = data.get_model_haiku_params(
-                model_name, 
-                self.model_params_dir
+        if run_relax:
+            relaxed_pdb = await self._run_relaxation(
+                best_model['unrelaxed_protein']
             )
+            best_model['relaxed_pdb'] = relaxed_pdb
             
-            model_runner = model.RunModel(cfg, params)
+        return best_model
             
+    async def _predict_model(
+        self,
+        model_name: str,
+        msa_features: Dict,
+        max_recycles: int
+    ) -> Dict:
+        """Run a single model on a worker thread"""
+        seq_len = int(msa_features['seq_length'][0])
+        padded_len = bucket_length(seq_len)
+        async with self._runners_lock:
+            model_runner = await asyncio.to_thread(
+                self._get_runner,
+                model_name,
+                max_recycles,
+                subbatch_size_for(padded_len)
+            )
+        
+        async with self._feature_slots:
             # Process features and run prediction
             logger.info('Processing features...')
-            processed_features = model_runner.process_features(
+            processed_features = await asyncio.to_thread(
+                model_runner.process_features,
                 msa_features, 
                 random_seed=0
             )
 
+            # Pad to a length bucket so the compiled model is reused across tasks
+            model_inputs = pad_features(
+                processed_features,
+                model_runner.config.data.eval.feat,
+                padded_len
+            )
+
             logger.info('Running prediction...')
-            prediction = model_runner.predict(processed_features, random_seed=0)
+            async with self._predict_slots:
+                prediction = await asyncio.to_thread(
+                    model_runner.predict, model_inputs, random_seed=0
+                )
+            del model_inputs
+            prediction = unpad_prediction(prediction, seq_len)
 
             # Store results
             logger.info('Storing results...')
-            results[model_name] = {
+            result = {
                 'plddt': prediction['plddt'],
                 'unrelaxed_protein': self._get_unrelaxed_protein(
                     processed_features,
                     prediction
                 )
             }
-            
-            if 'predicted_aligned_error' in prediction:
-                results[model_name]['pae'] = prediction['predicted_aligned_error']
-                
-        # Select best model and optionally relax
-        best_model = self._select_best_model(results)
         
-        if run_relax:
-            relaxed_pdb = await self._run_relaxation(
-                best_model['unrelaxed_protein']
-            )
-            best_model['relaxed_pdb'] = relaxed_pdb
-            
-        return best_model
+        if 'predicted_aligned_error' in prediction:
+            result['pae'] = prediction['predicted_aligned_error']
+        return result
             
     def _get_unrelaxed_protein(
         self,
@@ -92,8 +260,12 @@ class ModelService:
         """Convert prediction to Protein object"""
         logger.info("Converting prediction to Protein object...")
         # Set b-factors to per-residue plddt
-        final_atom_mask = prediction['structure_module']['final_atom_mask']
-        b_factors = prediction['plddt'][:, None] * final_atom_mask
+        # Keep both operands float32 so the (N_res, 37) product is not upcast
+        plddt = prediction['plddt'].astype(np.float32, copy=False)
+        final_atom_mask = prediction['structure_module']['final_atom_mask'].astype(
+            np.float32, copy=False
+        )
+        b_factors = plddt[:, None] * final_atom_mask
         
         return protein.from_prediction(
             processed_features,
@@ -104,28 +276,14 @@ class ModelService:
         
     def _select_best_model(self, results: Dict) -> Dict:
         """Select best model based on mean pLDDT"""
-        # Calculate mean pLDDT for each model
-        model_scores = {
-            name: np.mean(model['plddt']) 
-            for name, model in results.items()
-        }
+        # Mean pLDDT for every model in a single reduction over stacked scores
+        names = list(results)
+        scores = np.stack([results[name]['plddt'] for name in names]).mean(axis=1)
         
         # Select model with highest mean pLDDT
-        best_model_name = max(model_scores, key=model_scores.get)
-        return results[best_model_name]
+        return results[names[int(scores.argmax())]]
         
     async def _run_relaxation(self, prot: protein.Protein) -> str:
-        """Run AMBER relaxation"""
-        from alphafold.relax import relax
-        
-        relaxer = relax.AmberRelaxation(
-            max_iterations=0,
-            tolerance=2.39,
-            stiffness=10.0,
-            exclude_residues=[],
-            max_outer_iterations=3,
-            use_gpu=False  # Set via config if needed
-        )
-        
-        relaxed_pdb, _, _ = relaxer.process(prot=prot)
+        """Run AMBER relaxation on a worker thread"""
+        relaxed_pdb, _, _ = await asyncio.to_thread(self._relaxer.process, prot=prot)
         return relaxed_pdb 
\ No newline at end of file
@@ -0,0 +1,162 @@
+"""Tests for sequence-length bucketing and padding in the model service."""
+
+import os
+from unittest import mock
+
+from absl.testing import absltest
+from absl.testing import parameterized
+from alphafold.model.tf import shape_placeholders
+import numpy as np
+
+from services import model_service
+
+NUM_RES = shape_placeholders.NUM_RES
+NUM_MSA_SEQ = shape_placeholders.NUM_MSA_SEQ
+
+FEATURE_SHAPES = {
+    'aatype': [NUM_RES],
+    'msa_feat': [NUM_MSA_SEQ, NUM_RES, None],
+    'seq_length': [],
+}
+
+GiB = 1024 ** 3
+
+
+def _features(num_res: int, num_msa: int = 3):
+    # Processed features carry a leading ensemble dimension
+    rng = np.random.default_rng(0)
+    return {
+        'aatype': rng.integers(1, 20, size=(1, num_res)),
+        'msa_feat': rng.random((1, num_msa, num_res, 49), dtype=np.float32),
+        'seq_length': np.array([num_res]),
+        'not_in_schema': np.arange(num_res),
+    }
+
+
+def _prediction(num_res: int):
+    rng = np.random.default_rng(1)
+    return {
+        'plddt': rng.random(num_res) * 100,
+        'predicted_aligned_error': rng.random((num_res, num_res)) * 30,
+        'max_predicted_aligned_error': np.float32(31.75),
+        'ptm': np.float32(0.5),
+        'ranking_confidence': np.float32(50.0),
+        'structure_module': {
+            'final_atom_positions': rng.random((num_res, 37, 3)),
+            'final_atom_mask': np.ones((num_res, 37)),
+            'single': rng.random((num_res, 384)),
+        },
+    }
+
+
+class _Device:
+
+    def __init__(self, stats):
+        self._stats = stats
+
+    def memory_stats(self):
+        return self._stats
+
+
+class BucketLengthTest(parameterized.TestCase):
+
+    @parameterized.parameters(
+        (1, 256), (256, 256), (257, 512), (512, 512), (513, 768),
+        (1024, 1024), (1025, 1280), (2048, 2048), (2049, 2049),
+    )
+    def test_bucket_length(self, seq_len, expected):
+        self.assertEqual(model_service.bucket_length(seq_len), expected)
+
+
+class PaddingTest(absltest.TestCase):
+
+    def test_pad_features(self):
+        features = _features(100)
+        padded = model_service.pad_features(features, FEATURE_SHAPES, 256)
+
+        self.assertEqual(padded['aatype'].shape, (1, 256))
+        self.assertEqual(padded['msa_feat'].shape, (1, 3, 256, 49))
+        np.testing.assert_array_equal(padded['aatype'][:, :100], features['aatype'])
+        np.testing.assert_array_equal(padded['msa_feat'][:, :, :100], features['msa_feat'])
+        self.assertFalse(padded['aatype'][:, 100:].any())
+        self.assertFalse(padded['msa_feat'][:, :, 100:].any())
+        # Features without residue axes, or outside the schema, are untouched
+        self.assertIs(padded['seq_length'], features['seq_length'])
+        self.assertIs(padded['not_in_schema'], features['not_in_schema'])
+
+    def test_pad_features_at_bucket_length_is_a_no_op(self):
+        features = _features(256)
+        padded = model_service.pad_features(features, FEATURE_SHAPES, 256)
+        for name, value in features.items():
+            self.assertIs(padded[name], value)
+
+    def test_unpad_prediction_round_trip(self):
+        seq_len = 100
+        padded = _prediction(256)
+        unpadded = model_service.unpad_prediction(padded, seq_len)
+
+        np.testing.assert_array_equal(unpadded['plddt'], padded['plddt'][:seq_len])
+        np.testing.assert_array_equal(
+            unpadded['predicted_aligned_error'],
+            padded['predicted_aligned_error'][:seq_len, :seq_len]
+        )
+        for key in ('final_atom_positions', 'final_atom_mask'):
+            np.testing.assert_array_equal(
+                unpadded['structure_module'][key],
+                padded['structure_module'][key][:seq_len]
+            )
+        self.assertEqual(
+            unpadded['max_predicted_aligned_error'],
+            padded['max_predicted_aligned_error']
+        )
+
+    def test_unpad_prediction_drops_scores_pooled_over_padding(self):
+        padded = _prediction(256)
+        unpadded = model_service.unpad_prediction(padded, 100)
+
+        self.assertNotIn('ptm', unpadded)
+        self.assertAlmostEqual(
+            unpadded['ranking_confidence'], np.mean(padded['plddt'][:100])
+        )
+
+
+class SubbatchSizeTest(parameterized.TestCase):
+
+    def _patch_device(self, stats, mem_fraction='4.0'):
+        self.enter_context(mock.patch.object(
+            model_service.jax, 'devices', return_value=[_Device(stats)]
+        ))
+        self.enter_context(mock.patch.dict(
+            os.environ, {'XLA_PYTHON_CLIENT_MEM_FRACTION': mem_fraction}
+        ))
+
+    def test_no_memory_stats_keeps_default(self):
+        self._patch_device(None)
+        self.assertEqual(model_service.subbatch_size_for(1024), 4)
+
+    def test_device_error_keeps_default(self):
+        self.enter_context(mock.patch.object(
+            model_service.jax, 'devices', side_effect=RuntimeError('no backend')
+        ))
+        self.assertEqual(model_service.subbatch_size_for(1024), 4)
+
+    @parameterized.parameters((512, 32), (1024, 32), (2048, 8))
+    def test_unified_memory_limit_is_scaled_to_physical(self, num_res, expected):
+        # A 16 GB card with XLA_PYTHON_CLIENT_MEM_FRACTION=4.0 reports 64 GB
+        self._patch_device({'bytes_limit': 64 * GiB})
+        self.assertEqual(model_service.subbatch_size_for(num_res), expected)
+
+    def test_capped_at_num_res(self):
+        self._patch_device({'bytes_limit': 80 * GiB}, mem_fraction='1.0')
+        self.assertEqual(model_service.subbatch_size_for(16), 16)
+
+    def test_power_of_two(self):
+        self._patch_device({'bytes_limit': int(23.5 * GiB)}, mem_fraction='0.75')
+        for num_res in model_service.SEQ_LEN_BUCKETS:
+            size = model_service.subbatch_size_for(num_res)
+            self.assertEqual(size & (size - 1), 0, (num_res, size))
+            self.assertLessEqual(size, model_service.MAX_SUBBATCH_SIZE)
+
+
+if __name__ == '__main__':
+    absltest.main()
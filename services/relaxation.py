@@ -74,18 +74,9 @@ class RelaxationService:
         2: Confident (90 > pLDDT > 70)
         3: Very high (pLDDT > 90)
         """
-        bands = [
-            (0, 50),
-            (50, 70), 
-            (70, 90),
-            (90, 100)
-        ]
-        
-        banded_b_factors = []
-        for score in plddt:
-            for band_idx, (min_val, max_val) in enumerate(bands):
-                if min_val <= score <= max_val:
-                    banded_b_factors.append(band_idx)
-                    break
-                    
-        return np.array(banded_b_factors) 
\ No newline at end of file
+        # right=True keeps the upper band edge inclusive, e.g. pLDDT 50 -> band 0
+        return np.digitize(
+            np.asarray(plddt, dtype=np.float32),
+            np.array([50.0, 70.0, 90.0], dtype=np.float32),
+            right=True
+        ) 
\ No newline at end of file
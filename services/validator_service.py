@@ -1,5 +1,5 @@
 import logging
-from typing import Dict
+from typing import Dict, Optional, Tuple
 from services.model_service import ModelService
 from services.relaxation import RelaxationService
 from services.confidence import ConfidenceService
@@ -7,10 +7,53 @@ from services.client_service import ClientService
 from config import settings
 import asyncio
 import json
-import sys
+import random
+import tempfile
+from pathlib import Path
 
 logger = logging.getLogger(__name__)
 
+# With KEEP_LOCAL_ARTIFACTS, result files are kept under <tmp>/desci-validator/<task_id>
+RESULTS_ROOT = Path(tempfile.gettempdir()) / 'desci-validator'
+
+class UnregisteredError(Exception):
+    """Wallet is not registered (as a validator) with the server"""
+
+def _encode_results(prediction: Dict, metrics: Dict) -> Dict[str, Tuple[str, bytes]]:
+    """Serialize result files as (filename, contents) keyed by file type"""
+    results = {
+        'prediction': ('prediction.pdb', prediction['relaxed_pdb'].encode()),
+        'metrics': ('metrics.json', json.dumps({
+            'mean_plddt': metrics['mean_plddt']
+        }, indent=4).encode()),
+    }
+    if 'pae_json' in metrics:
+        results['pae'] = (
+            'predicted_aligned_error.json',
+            json.dumps(metrics['pae_json'], indent=4).encode()
+        )
+    return results
+
+def _write_results(output_dir: Path, results: Dict[str, Tuple[str, bytes]]) -> None:
+    output_dir.mkdir(parents=True, exist_ok=True)
+    for filename, contents in results.values():
+        (output_dir / filename).write_bytes(contents)
+
+async def _gather_or_cancel(*aws):
+    """Like ``asyncio.gather``, but cancel the remaining awaitables on failure
+
+    Plain ``gather`` leaves siblings running unawaited when one raises, so a
+    failed status update would strand a large MSA download in the background.
+    """
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
 class ValidatorService:
     def __init__(
         self,
@@ -19,10 +62,18 @@ class ValidatorService:
         use_gpu: bool = False
     ):
         """Initialize validator service"""
-        self.model_service = ModelService(model_params_dir)
+        self.model_service = ModelService(
+            model_params_dir,
+            max_concurrent_predictions=settings.MAX_CONCURRENT_PREDICTIONS
+        )
         self.relaxation_service = RelaxationService(use_gpu)
         self.confidence_service = ConfidenceService()
-        self.client_service = ClientService(api_url)
+        self.client_service = ClientService(
+            api_url,
+            compress_uploads=settings.UPLOAD_COMPRESSION
+        )
+        # Seconds to wait after the next failed iteration; doubles per failure
+        self._backoff = 1.0
 
     async def run(self, wallet_address: str):
         """Run validation loop"""
@@ -30,48 +81,63 @@ class ValidatorService:
             try:
                 # Get next task from server
                 logger.info("Getting next task from server")
-                task = await self.client_service.get_next_task(wallet_address)
+                task = await self.client_service.get_next_task(
+                    wallet_address,
+                    wait=settings.TASK_LONG_POLL_WAIT
+                )
 
                 if task == 0:
-                    logger.warning("Sorry, your wallet is not registered. Kindly register to access Decentralizing Scientific Discovery Lab.")
-                    logger.info("Shutting down gracefully...")
-                    sys.exit(0)
+                    raise UnregisteredError("Sorry, your wallet is not registered. Kindly register to access Decentralizing Scientific Discovery Lab.")
 
                 elif task == 2:
-                    logger.warning("Sorry, your are not registered as a Validator.")
-                    logger.info("Shutting down validator gracefully...")
-                    sys.exit(0)
+                    raise UnregisteredError("Sorry, your are not registered as a Validator.")
                 
                 if not task:
                     logger.info("No tasks available")
+                    self._backoff = 1.0
                     continue
                     
                 logger.info(f"Got task: {task['task_id']}")
                 
-                await self.client_service.update_task_status(task['task_id'], wallet_address, 'pending')
-
-                # Get MSA results
+                # Mark the task pending while its MSA results download, so the
+                # status update does not cost an extra serial round trip
                 logger.info("Getting MSA features")
-                msa_features = await self.client_service.get_msa_results(
-                    task['task_id'],
-                    wallet_address,
-                    task['pointer_wallet'],                
+                _, msa_features = await _gather_or_cancel(
+                    self.client_service.update_task_status(task['task_id'], wallet_address, 'pending'),
+                    self.client_service.get_msa_results(
+                        task['task_id'],
+                        wallet_address,
+                        task['pointer_wallet'],                
+                    )
                 )
     
                 # Run validation
-                result_paths = await self.validate_structure(
+                results = await self.validate_structure(
                     msa_features,
-                    run_relax=True
+                    run_relax=True,
+                    output_dir=(
+                        RESULTS_ROOT / str(task['task_id'])
+                        if settings.KEEP_LOCAL_ARTIFACTS else None
+                    )
                 )
 
                 # Upload results
                 logger.info("Uploading results")
 
-                for i, (file_type, file_path) in enumerate(result_paths.items()):
-                    await self.client_service.upload_validation_results(task['task_id'], 
-                                                                        wallet_address, 
-                                                                        str(file_path), 
-                                                                        file_type)
+                upload_slots = asyncio.Semaphore(4)
+
+                async def upload(file_type: str, filename: str, contents: bytes) -> bool:
+                    async with upload_slots:
+                        return await self.client_service.upload_validation_results(task['task_id'], 
+                                                                                   wallet_address, 
+                                                                                   filename, 
+                                                                                   contents, 
+                                                                                   file_type)
+
+                await _gather_or_cancel(*[
+                    upload(file_type, filename, contents)
+                    for file_type, (filename, contents) in results.items()
+                ])
 
                 logger.info(f"Results uploaded...")
 
@@ -79,24 +145,40 @@ class ValidatorService:
                 await self.client_service.update_task_status(task['task_id'], wallet_address, 'completed')
 
                 logger.info(f"Task status updated...")
+                self._backoff = 1.0
 
                 await self.client_service.get_validator_info(wallet_address)
 
-                logger.info("Hibernating validator service...")
-
-                await asyncio.sleep(settings.TASK_POLL_INTERVAL)
+                # With long polling the server paces us; otherwise wait between tasks
+                if not settings.TASK_LONG_POLL_WAIT:
+                    logger.info("Hibernating validator service...")
+                    await asyncio.sleep(settings.TASK_POLL_INTERVAL)
     
+            except UnregisteredError:
+                raise
             except Exception as e:
                 logger.error(f"Error in validation loop: {str(e)}")
-                await asyncio.sleep(5)
+                # Exponential backoff with jitter so a fleet does not retry in lockstep
+                await asyncio.sleep(min(60.0, self._backoff) * (0.5 + random.random()))
+                self._backoff *= 2
                 continue
 
     async def validate_structure(
         self,
         msa_features: Dict,
-        run_relax: bool = True
-    ) -> Dict:
-        """Run structure validation"""
+        run_relax: bool = True,
+        output_dir: Optional[Path] = None
+    ) -> Dict[str, Tuple[str, bytes]]:
+        """Run structure validation
+        
+        Args:
+            msa_features: MSA features for the task
+            run_relax: Whether to run AMBER relaxation
+            output_dir: If set, result files are also written to this directory
+            
+        Returns:
+            Mapping of file type to (filename, contents) ready for upload
+        """
         try:
             # Run model prediction
             logger.info("Running model prediction")
@@ -105,48 +187,24 @@ class ValidatorService:
                 run_relax=run_relax
             )
 
-            # Calculate confidence metrics
-            metrics = self.confidence_service.calculate_metrics(
+            # Calculate confidence metrics on a worker thread; PAE encoding
+            # scales with the square of the sequence length
+            metrics = await asyncio.to_thread(
+                self.confidence_service.calculate_metrics,
                 plddt=prediction['plddt'],
                 pae=prediction.get('pae'),
                 max_pae=prediction.get('max_pae')
             )
 
-            # Prepare results for upload
-            results = {
-                'prediction.pdb': prediction['relaxed_pdb'],
-                'metrics.json': {
-                    'mean_plddt': metrics['mean_plddt']
-                }
-            }
             logger.info("Validation completed")
 
-            with open('prediction.pdb', 'w') as pp:
-                pp.write(prediction['relaxed_pdb'])
-            
-            with open('metrics.json', 'w') as json_file:
-                    json.dump({
-                    'mean_plddt': metrics['mean_plddt']
-                }, json_file, indent=4)  
-
-            result_path = {
-                    'prediction': 'prediction.pdb',
-                    'metrics': 'metrics.json'
-                }
-
-            if 'pae_json' in metrics:
-                results['predicted_aligned_error.json'] = metrics['pae_json']
-
-                with open('predicted_aligned_error.json', 'w') as pj:
-                    json.dump(metrics['pae_json'], pj, indent=4) 
+            # Encode results in memory, off the event loop; upload needs no disk round trip
+            results = await asyncio.to_thread(_encode_results, prediction, metrics)
 
-                result_path = {
-                    'prediction': 'prediction.pdb',
-                    'metrics': 'metrics.json',
-                    'pae': 'predicted_aligned_error.json',
-                }
+            if output_dir is not None:
+                await asyncio.to_thread(_write_results, output_dir, results)
 
-            return result_path
+            return results
             
         except Exception as e:
             logger.error(f"Validation failed: {str(e)}")
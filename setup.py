@@ -1,37 +1,179 @@
-import os
-import subprocess
+import hashlib
 import logging
+import shutil
+import tarfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import urllib.request
+from tenacity import before_sleep_log, retry, retry_if_exception_type, stop_after_attempt, wait_exponential
+from config import settings
 
 logger = logging.getLogger(__name__)
 
 PARAMS_URL = 'https://storage.googleapis.com/alphafold/alphafold_params_colab_2022-12-06.tar'
 STEREO_CHEMICAL_PROPS_URL = 'https://git.scicore.unibas.ch/schwede/openstructure/-/raw/7102c63615b64735c4941278d92b554ec94415f8/modules/mol/alg/src/stereo_chemical_props.txt'
 
+# Parallel HTTP Range download of the params archive
+DOWNLOAD_PART_SIZE = 8 * 1024 * 1024
+DOWNLOAD_PARALLELISM = 8
+
+DOWNLOAD_TIMEOUT = 60  # seconds without progress before a part is retried
+
+# The archive is fetched as hundreds of parts; a transient failure in one of
+# them should not abort (and wipe) the whole install
+@retry(
+    stop=stop_after_attempt(3),
+    wait=wait_exponential(multiplier=1, min=1, max=8),
+    retry=retry_if_exception_type(OSError),
+    before_sleep=before_sleep_log(logger, logging.WARNING),
+    reraise=True
+)
+def _fetch_range(url: str, start: int, end: int) -> bytes:
+    request = urllib.request.Request(url, headers={'Range': f'bytes={start}-{end}'})
+    with urllib.request.urlopen(request, timeout=DOWNLOAD_TIMEOUT) as response:
+        if response.status != 206:
+            raise IOError(f"Server ignored range request for {url}")
+        data = response.read()
+    if len(data) != end - start + 1:
+        raise IOError(f"Short read for bytes {start}-{end} of {url}")
+    return data
+
+class RangedReader:
+    """Sequential file-like reader backed by parallel HTTP Range requests
+
+    Up to ``parallelism`` parts are downloaded at once and handed out in order,
+    so the stream can be consumed directly by ``tarfile`` in ``'r|'`` mode.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        size: int,
+        part_size: int = DOWNLOAD_PART_SIZE,
+        parallelism: int = DOWNLOAD_PARALLELISM
+    ):
+        self._url = url
+        self._size = size
+        self._part_size = part_size
+        self._parallelism = parallelism
+        self._executor = ThreadPoolExecutor(max_workers=parallelism)
+        self._parts = deque()
+        self._next_offset = 0
+        self._buffer = memoryview(b'')
+        self._schedule()
+
+    def _schedule(self):
+        while len(self._parts) < self._parallelism and self._next_offset < self._size:
+            end = min(self._next_offset + self._part_size, self._size) - 1
+            self._parts.append(
+                self._executor.submit(_fetch_range, self._url, self._next_offset, end)
+            )
+            self._next_offset = end + 1
+
+    def read(self, size: int = -1) -> bytes:
+        chunks = []
+        while size != 0:
+            if not self._buffer:
+                if not self._parts:
+                    break
+                self._buffer = memoryview(self._parts.popleft().result())
+                self._schedule()
+            take = len(self._buffer) if size < 0 else min(size, len(self._buffer))
+            chunks.append(self._buffer[:take])
+            self._buffer = self._buffer[take:]
+            if size > 0:
+                size -= take
+        return b''.join(chunks)
+
+    def close(self):
+        for part in self._parts:
+            part.cancel()
+        self._executor.shutdown(wait=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class HashingReader:
+    """File-like wrapper that SHA-256 hashes everything read through it"""
+
+    def __init__(self, inner):
+        self._inner = inner
+        self._hash = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._inner.read(size)
+        self._hash.update(data)
+        return data
+
+    def drain(self, chunk_size: int = 1024 * 1024):
+        """Read (and hash) whatever the consumer left unread"""
+        while self.read(chunk_size):
+            pass
+
+    def hexdigest(self) -> str:
+        return self._hash.hexdigest()
+
+def open_download(url: str):
+    """Open ``url`` for sequential reading, using parallel ranges when supported"""
+    try:
+        with urllib.request.urlopen(
+            urllib.request.Request(url, method='HEAD'),
+            timeout=DOWNLOAD_TIMEOUT
+        ) as response:
+            size = int(response.headers.get('Content-Length') or 0)
+            accepts_ranges = response.headers.get('Accept-Ranges', '').lower() == 'bytes'
+    except (OSError, ValueError) as e:
+        # Some servers reject HEAD (403/405); a plain GET may still work
+        logger.warning(f"HEAD {url} failed ({e}), downloading without ranges")
+        return urllib.request.urlopen(url)
+    if accepts_ranges and size > DOWNLOAD_PART_SIZE:
+        return RangedReader(url, size)
+    return urllib.request.urlopen(url)
+
+def _extract_archive(tar: tarfile.TarFile, dest: Path):
+    """Extract a streamed tar, refusing members that could escape ``dest``"""
+    if hasattr(tarfile, 'data_filter'):
+        # 'data' rejects absolute paths, '..' members and special files
+        tar.extractall(dest, filter='data')
+        return
+    # Python releases without extraction filters: apply the same rules by hand
+    root = dest.resolve()
+    for member in tar:
+        target = (root / member.name).resolve()
+        if Path(member.name).is_absolute() or (target != root and root not in target.parents):
+            raise tarfile.TarError(f"Refusing to extract {member.name!r} outside {dest}")
+        if not (member.isfile() or member.isdir()):
+            raise tarfile.TarError(f"Refusing to extract special member {member.name!r}")
+        tar.extract(member, dest)
+
 def setup_alphafold():
     """Download and setup AlphaFold parameters and dependencies"""
+    params_dir = Path('./alphafold/data/params')
+    completed = False
     try:
         # Create params directory
-        params_dir = Path('./alphafold/data/params')
         params_dir.mkdir(parents=True, exist_ok=True)
         
-        # Download parameters
-        params_path = params_dir / os.path.basename(PARAMS_URL)
-        logger.info("Downloading AlphaFold parameters...")
-        urllib.request.urlretrieve(PARAMS_URL, params_path)
-        
-        # Extract parameters
-        logger.info("Extracting parameters...")
-        subprocess.run([
-            'tar', '--extract', '--verbose',
-            '--file', str(params_path),
-            '--directory', str(params_dir),
-            '--preserve-permissions'
-        ], check=True)
-        
-        # Clean up tar file
-        params_path.unlink()
+        # Download parameters and extract them as the bytes arrive
+        logger.info("Downloading and extracting AlphaFold parameters...")
+        with open_download(PARAMS_URL) as response:
+            # Hash while streaming so verification needs no second pass over the data
+            reader = HashingReader(response)
+            # 'r|' reads the archive as a stream, so it is never written to disk
+            with tarfile.open(fileobj=reader, mode='r|') as tar:
+                _extract_archive(tar, params_dir)
+            # Include trailing tar padding in the digest
+            reader.drain()
+
+        digest = reader.hexdigest()
+        logger.info(f"AlphaFold parameters SHA-256: {digest}")
+        expected = settings.ALPHAFOLD_PARAMS_SHA256
+        if expected and digest != expected.lower():
+            raise IOError(f"Checksum mismatch for {PARAMS_URL}: expected {expected}, got {digest}")
         
         # Download stereo chemical props
         props_dir = Path('./alphafold/common')
@@ -42,8 +184,15 @@ def setup_alphafold():
         urllib.request.urlretrieve(STEREO_CHEMICAL_PROPS_URL, props_path)
         
         logger.info("Setup completed successfully")
+        completed = True
         return True
         
     except Exception as e:
         logger.error(f"Setup failed: {str(e)}")
-        return False 
\ No newline at end of file
+        return False
+
+    finally:
+        # Startup only checks that params_dir exists, so never leave a partial
+        # install behind; the next start then downloads everything again
+        if not completed:
+            shutil.rmtree(params_dir, ignore_errors=True) 
\ No newline at end of file
@@ -1,7 +1,26 @@
 import logging
 import sys
+import threading
 from datetime import datetime
 
+class CachedTimeFormatter(logging.Formatter):
+    """Formatter that renders ``asctime`` at most once per second per thread"""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._local = threading.local()
+    
+    def formatTime(self, record, datefmt=None):
+        if datefmt is None:
+            # Default format carries milliseconds, so it can't be cached per second
+            return super().formatTime(record, datefmt)
+        second = int(record.created)
+        cached = getattr(self._local, 'cached', None)
+        if cached is None or cached[0] != second:
+            cached = (second, super().formatTime(record, datefmt))
+            self._local.cached = cached
+        return cached[1]
+
 class ColoredFormatter(logging.Formatter):
     """Custom formatter with colors and timestamps"""
     
@@ -20,9 +39,17 @@ class ColoredFormatter(logging.Formatter):
         logging.CRITICAL: bold_red + "%(asctime)s - CRITICAL - %(message)s" + reset
     }
     
+    def __init__(self):
+        super().__init__()
+        # One formatter per level, built once instead of on every record
+        self._formatters = {
+            level: CachedTimeFormatter(log_fmt, datefmt='%Y-%m-%d %H:%M:%S')
+            for level, log_fmt in self.FORMATS.items()
+        }
+        self._default_formatter = CachedTimeFormatter(datefmt='%Y-%m-%d %H:%M:%S')
+    
     def format(self, record):
-        log_fmt = self.FORMATS.get(record.levelno)
-        formatter = logging.Formatter(log_fmt, datefmt='%Y-%m-%d %H:%M:%S')
+        formatter = self._formatters.get(record.levelno, self._default_formatter)
         return formatter.format(record)
 
 def setup_logging():
@@ -30,7 +57,13 @@ def setup_logging():
     handler = logging.StreamHandler(sys.stdout)
     handler.setFormatter(ColoredFormatter())
     
-    logging.basicConfig(
-        level=logging.INFO,
-        handlers=[handler]
-    ) 
\ No newline at end of file
+    # basicConfig is a no-op once absl/JAX/TF have attached root handlers,
+    # so replace them explicitly to avoid duplicate formatting and output
+    root = logging.getLogger()
+    root.handlers.clear()
+    root.addHandler(handler)
+    root.setLevel(logging.INFO)
+    
+    absl_logger = logging.getLogger('absl')
+    absl_logger.handlers = [handler]
+    absl_logger.propagate = False 
\ No newline at end of file
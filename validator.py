@@ -2,7 +2,7 @@
 import asyncio
 import logging
 import argparse
-from services.validator_service import ValidatorService
+from services.validator_service import ValidatorService, UnregisteredError
 from config import settings
 from utils.logging import setup_logging
 from pathlib import Path
@@ -23,6 +23,9 @@ async def main(wallet_address: str, api_url: str):
         if settings.USE_GPU:
             logger.info("GPU support enabled")
         
+        # Reuse compiled XLA programs from previous runs
+        settings.setup_jax_cache()
+        
         # Run setup if needed
         params_dir = Path('./alphafold/data/params')
         if not params_dir.exists():
@@ -40,7 +43,13 @@ async def main(wallet_address: str, api_url: str):
         logger.info(f"Validator initialized with wallet: {wallet_address}")
         
         try:
-            await validator.run(wallet_address)
+            # Share one pooled HTTP session for the lifetime of the validator
+            async with validator.client_service:
+                await validator.run(wallet_address)
+        except UnregisteredError as e:
+            # The session is already closed by the context manager above
+            logger.warning(str(e))
+            logger.info("Shutting down validator gracefully...")
         except KeyboardInterrupt:
             logger.info("\nShutting down validator gracefully...")
             